@@ -3,28 +3,42 @@
 Convert Spleeter pretrained models (2/4/5 stems) to ONNX format.
 
 Requirements:
-  pip install tensorflow torch onnx onnxmltools onnxruntime
+  pip install tensorflow torch onnx onnxmltools onnxruntime safetensors
 
 Usage:
   python scripts/convert-spleeter-onnx.py --model 4stems
   python scripts/convert-spleeter-onnx.py --model 5stems
   python scripts/convert-spleeter-onnx.py --model 2stems
+  python scripts/convert-spleeter-onnx.py --model 4stems --fp16
+  python scripts/convert-spleeter-onnx.py --model 4stems --int8 dynamic
+  python scripts/convert-spleeter-onnx.py --model 4stems --ort-optimize all
 
 Output files are written to ./spleeter-onnx/{model}/ (e.g. ./spleeter-onnx/4stems/vocals.onnx)
 
+Exported models take x: [num_splits, 2, 512, 1024] (NCHW). The sherpa-onnx
+2stems models take [2, num_splits, 512, 1024]; stemSeparation.worker.ts
+detects which one it was given.
+
 After conversion, upload the .onnx files to HuggingFace:
   huggingface-cli upload your-username/sherpa-onnx-spleeter-4stems ./spleeter-onnx/4stems/
 """
 
 import argparse
+import hashlib
+import io
+import multiprocessing
 import os
+import shutil
+import subprocess
 import sys
 import tarfile
 import urllib.request
+from concurrent.futures import ProcessPoolExecutor
 
 import numpy as np
 import onnx
 import torch
+from onnx import helper, numpy_helper
 import torch.nn as nn
 import torch.nn.functional as F
 
@@ -102,8 +116,7 @@ class UNet(nn.Module):
         return F.relu(x)
 
     def forward(self, x):
-        """x: [2, num_splits, 512, 1024] → y: [2, num_splits, 512, 1024]"""
-        x = x.permute(1, 0, 2, 3)  # [num_splits, 2, 512, 1024]
+        """x: [num_splits, 2, 512, 1024] → y: [num_splits, 2, 512, 1024]"""
         in_x = x
 
         # Encoder
@@ -130,7 +143,10 @@ class UNet(nn.Module):
         x = F.pad(rel6, (1, 2, 1, 2))
         conv6 = self.conv5(x)
 
-        # Decoder with skip connections
+        # Decoder with skip connections. torch.cat exports as a single ONNX
+        # Concat that writes each input once; writing into a pre-allocated
+        # buffer would trace to ScatterND, and splitting each ConvTranspose
+        # into two summed halves writes its (4x larger) output twice.
         up1 = self._dec_act(self.bn5(self.up1(conv6)[:, :, 1:-2, 1:-2]))
         up2 = self._dec_act(self.bn6(self.up2(torch.cat([conv5, up1], 1))[:, :, 1:-2, 1:-2]))
         up3 = self._dec_act(self.bn7(self.up3(torch.cat([conv4, up2], 1))[:, :, 1:-2, 1:-2]))
@@ -147,7 +163,85 @@ class UNet(nn.Module):
             # 2stems/4stems: sigmoid mask
             ans = torch.sigmoid(up7) * in_x
 
-        return ans.permute(1, 0, 2, 3)  # [2, num_splits, 512, 1024]
+        return ans
+
+    def fuse_batchnorm(self):
+        """Fold the decoder BatchNorms into their ConvTranspose2d (eval only).
+
+        The encoder BNs stay: the skip connections concatenate the raw
+        pre-BN conv outputs, so folding those would change the decoder input.
+        """
+        for i in range(1, 7):
+            bn_name = f"bn{i + 4}"
+            fuse_bn_into_conv(getattr(self, f"up{i}"), getattr(self, bn_name))
+            setattr(self, bn_name, nn.Identity())
+        return self
+
+
+@torch.no_grad()
+def fuse_bn_into_conv(conv, bn):
+    """Fold an eval-mode BatchNorm2d into the weight and bias of the preceding conv."""
+    scale = bn.weight / torch.sqrt(bn.running_var + bn.eps)
+    if isinstance(conv, nn.ConvTranspose2d):
+        # ConvTranspose2d weights are [C_in, C_out, kH, kW]
+        conv.weight.mul_(scale.reshape(1, -1, 1, 1))
+    else:
+        conv.weight.mul_(scale.reshape(-1, 1, 1, 1))
+
+    bias = conv.bias if conv.bias is not None else torch.zeros_like(bn.running_mean)
+    conv.bias = nn.Parameter((bias - bn.running_mean) * scale + bn.bias)
+
+
+# ─── Download / Extract ──────────────────────────────────────────────────────
+
+def sha256_file(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def download(url, dest, chunk_size=1 << 20):
+    """Stream url to dest and record its SHA-256 in dest + ".sha256".
+
+    Data goes to dest + ".part" first, so an interrupted download never
+    leaves a truncated archive that later runs would treat as cached.
+    """
+    digest = hashlib.sha256()
+    part = dest + ".part"
+    with urllib.request.urlopen(url, timeout=60) as response, open(part, "wb") as f:
+        while chunk := response.read(chunk_size):
+            f.write(chunk)
+            digest.update(chunk)
+    os.replace(part, dest)
+    with open(dest + ".sha256", "w") as f:
+        f.write(digest.hexdigest())
+
+
+def is_cached(path):
+    """True if path exists and matches the SHA-256 recorded by download(), if any."""
+    if not os.path.exists(path):
+        return False
+    if not os.path.exists(path + ".sha256"):
+        return True  # downloaded before checksums were recorded
+    with open(path + ".sha256") as f:
+        return f.read().strip() == sha256_file(path)
+
+
+def extract_tar(tar_name, extract_dir):
+    """Extract a .tar.gz, decompressing with pigz across all cores when installed."""
+    if shutil.which("pigz") and shutil.which("tar"):
+        pigz = subprocess.Popen(["pigz", "-dc", tar_name], stdout=subprocess.PIPE)
+        tar = subprocess.Popen(["tar", "-xf", "-", "-C", extract_dir], stdin=pigz.stdout)
+        pigz.stdout.close()  # tar owns the pipe now
+        for proc in (tar, pigz):
+            if proc.wait() != 0:
+                raise subprocess.CalledProcessError(proc.returncode, proc.args)
+    else:
+        # Streaming mode reads the archive once, front to back, without seeking
+        with tarfile.open(tar_name, "r|gz") as tar:
+            tar.extractall(extract_dir)
 
 
 # ─── TF Checkpoint → PyTorch ─────────────────────────────────────────────────
@@ -174,30 +268,68 @@ def freeze_graph(model_dir, output_node_name, output_filename):
     print(f"  Frozen graph: {len(output_graph_def.node)} ops -> {output_filename}")
 
 
-def get_param(graph, name):
-    """Extract a constant parameter from a frozen TF graph."""
+class WeightMappingError(ValueError):
+    """A TF constant is missing or doesn't fit the UNet parameter it maps to."""
+
+
+_SESSIONS = {}
+_GRAPHS = {}
+
+
+def get_session(graph):
+    """Return the shared TF session for a graph, creating it on first use."""
     import tensorflow as tf
 
-    with tf.compat.v1.Session(graph=graph) as sess:
-        for op in sess.graph.get_operations():
-            if op.type == "Const" and op.name == name:
-                return torch.from_numpy(sess.run(op.outputs[0]))
-    raise ValueError(f"Parameter not found: {name}")
+    if graph not in _SESSIONS:
+        _SESSIONS[graph] = tf.compat.v1.Session(graph=graph)
+    return _SESSIONS[graph]
+
+
+def close_sessions():
+    """Close the shared TF sessions and drop the graphs load_frozen_graph() kept."""
+    while _SESSIONS:
+        _, sess = _SESSIONS.popitem()
+        sess.close()
+    _GRAPHS.clear()
 
 
 def load_frozen_graph(filename):
+    """Load a frozen graph, plus a {name: op} index of its Const ops.
+
+    The result is kept until close_sessions(), so a process converting several
+    instruments parses the multi-instrument graph only once.
+    """
     import tensorflow as tf
 
+    if filename in _GRAPHS:
+        return _GRAPHS[filename]
     with tf.compat.v1.gfile.GFile(filename, "rb") as f:
         graph_def = tf.compat.v1.GraphDef()
         graph_def.ParseFromString(f.read())
     with tf.Graph().as_default() as graph:
         tf.import_graph_def(graph_def, name="")
-    return graph
+    const_ops = {op.name: op for op in graph.get_operations() if op.type == "Const"}
+    _GRAPHS[filename] = graph, const_ops
+    return graph, const_ops
+
+
+def get_param(const_ops, name):
+    """Look up a Const op by name in the index built by load_frozen_graph()."""
+    try:
+        return const_ops[name]
+    except KeyError:
+        raise WeightMappingError(f"Parameter not found: {name}") from None
 
 
-def convert_weights(graph, unet, instrument_idx):
-    """Load TF frozen graph weights into a PyTorch UNet.
+def extract_consts(graph, const_ops, names):
+    """Fetch the named Const tensors of a frozen TF graph as numpy arrays in one session.run."""
+    names = list(names)
+    tensors = [get_param(const_ops, name).outputs[0] for name in names]
+    return dict(zip(names, get_session(graph).run(tensors)))
+
+
+def param_names(instrument_idx):
+    """Map UNet state_dict keys to TF Const names for one instrument.
 
     Each instrument occupies a fixed offset in TF's sequential op naming:
     - 7 Conv2d ops per instrument (6 encoder + 1 output)
@@ -210,85 +342,369 @@ def convert_weights(graph, unet, instrument_idx):
     bn_offset = instrument_idx * 12
     transpose_offset = instrument_idx * 6
 
-    state_dict = unet.state_dict()
+    names = {}
+
+    def conv(key, tf_name):
+        names[f"{key}.weight"] = f"{tf_name}/kernel"
+        names[f"{key}.bias"] = f"{tf_name}/bias"
+
+    def bn(key, tf_name):
+        names[f"{key}.weight"] = f"{tf_name}/gamma"
+        names[f"{key}.bias"] = f"{tf_name}/beta"
+        names[f"{key}.running_mean"] = f"{tf_name}/moving_mean"
+        names[f"{key}.running_var"] = f"{tf_name}/moving_variance"
 
     # First encoder conv + bn
     if instrument_idx == 0:
-        conv_name = "conv2d"
-        bn_name = "batch_normalization"
+        conv("conv", "conv2d")
+        bn("bn", "batch_normalization")
     else:
-        conv_name = f"conv2d_{conv_offset}"
-        bn_name = f"batch_normalization_{bn_offset}"
-
-    state_dict["conv.weight"] = get_param(graph, f"{conv_name}/kernel").permute(3, 2, 0, 1)
-    state_dict["conv.bias"] = get_param(graph, f"{conv_name}/bias")
-    state_dict["bn.weight"] = get_param(graph, f"{bn_name}/gamma")
-    state_dict["bn.bias"] = get_param(graph, f"{bn_name}/beta")
-    state_dict["bn.running_mean"] = get_param(graph, f"{bn_name}/moving_mean")
-    state_dict["bn.running_var"] = get_param(graph, f"{bn_name}/moving_variance")
+        conv("conv", f"conv2d_{conv_offset}")
+        bn("bn", f"batch_normalization_{bn_offset}")
 
     # Encoder convs 1-5
     for i in range(1, 6):
-        c_idx = conv_offset + i
-        state_dict[f"conv{i}.weight"] = get_param(graph, f"conv2d_{c_idx}/kernel").permute(3, 2, 0, 1)
-        state_dict[f"conv{i}.bias"] = get_param(graph, f"conv2d_{c_idx}/bias")
+        conv(f"conv{i}", f"conv2d_{conv_offset + i}")
         if i < 5:
-            b_idx = bn_offset + i
-            state_dict[f"bn{i}.weight"] = get_param(graph, f"batch_normalization_{b_idx}/gamma")
-            state_dict[f"bn{i}.bias"] = get_param(graph, f"batch_normalization_{b_idx}/beta")
-            state_dict[f"bn{i}.running_mean"] = get_param(graph, f"batch_normalization_{b_idx}/moving_mean")
-            state_dict[f"bn{i}.running_var"] = get_param(graph, f"batch_normalization_{b_idx}/moving_variance")
+            bn(f"bn{i}", f"batch_normalization_{bn_offset + i}")
 
     # Decoder transpose convs and batch norms
     if instrument_idx == 0:
-        t_name = "conv2d_transpose"
+        conv("up1", "conv2d_transpose")
     else:
-        t_name = f"conv2d_transpose_{transpose_offset}"
-
-    state_dict["up1.weight"] = get_param(graph, f"{t_name}/kernel").permute(3, 2, 0, 1)
-    state_dict["up1.bias"] = get_param(graph, f"{t_name}/bias")
+        conv("up1", f"conv2d_transpose_{transpose_offset}")
 
     bn5_idx = bn_offset + 5 + 1  # skip one (pattern from sherpa-onnx: encoder uses 0-4, then 6+ for decoder)
-    state_dict["bn5.weight"] = get_param(graph, f"batch_normalization_{bn5_idx}/gamma")
-    state_dict["bn5.bias"] = get_param(graph, f"batch_normalization_{bn5_idx}/beta")
-    state_dict["bn5.running_mean"] = get_param(graph, f"batch_normalization_{bn5_idx}/moving_mean")
-    state_dict["bn5.running_var"] = get_param(graph, f"batch_normalization_{bn5_idx}/moving_variance")
+    bn("bn5", f"batch_normalization_{bn5_idx}")
 
     for i in range(1, 6):
-        t_idx = transpose_offset + i
-        state_dict[f"up{i+1}.weight"] = get_param(graph, f"conv2d_transpose_{t_idx}/kernel").permute(3, 2, 0, 1)
-        state_dict[f"up{i+1}.bias"] = get_param(graph, f"conv2d_transpose_{t_idx}/bias")
-        b_idx = bn5_idx + i
-        state_dict[f"bn{5+i}.weight"] = get_param(graph, f"batch_normalization_{b_idx}/gamma")
-        state_dict[f"bn{5+i}.bias"] = get_param(graph, f"batch_normalization_{b_idx}/beta")
-        state_dict[f"bn{5+i}.running_mean"] = get_param(graph, f"batch_normalization_{b_idx}/moving_mean")
-        state_dict[f"bn{5+i}.running_var"] = get_param(graph, f"batch_normalization_{b_idx}/moving_variance")
+        conv(f"up{i+1}", f"conv2d_transpose_{transpose_offset + i}")
+        bn(f"bn{5+i}", f"batch_normalization_{bn5_idx + i}")
 
     # Output conv
-    final_conv_idx = conv_offset + 6
-    state_dict["up7.weight"] = get_param(graph, f"conv2d_{final_conv_idx}/kernel").permute(3, 2, 0, 1)
-    state_dict["up7.bias"] = get_param(graph, f"conv2d_{final_conv_idx}/bias")
+    conv("up7", f"conv2d_{conv_offset + 6}")
+
+    return names
 
-    unet.load_state_dict(state_dict)
+
+def convert_weights(params, unet, instrument_idx):
+    """Load TF frozen graph weights (from extract_consts) into a PyTorch UNet.
+
+    Values are copied straight into the existing parameter storage (state_dict
+    tensors alias it), so no replacement tensors are allocated and no
+    load_state_dict() pass is needed.
+    """
+    state_dict = unet.state_dict()
+    for key, tf_name in param_names(instrument_idx).items():
+        arr = params[tf_name]
+        if arr.ndim == 4:
+            # TF kernels are [kH, kW, in, out] ([kH, kW, out, in] for transpose convs);
+            # PyTorch puts the two channel axes first, in swapped order
+            arr = arr.transpose(3, 2, 0, 1)  # a view; copyto does the one reorder pass
+        target = state_dict[key]
+        if arr.shape != tuple(target.shape):
+            # copyto would broadcast a wrong-offset tensor in silently
+            raise WeightMappingError(
+                f"Shape mismatch for {key} <- {tf_name}: TF {arr.shape}, UNet {tuple(target.shape)}"
+            )
+        np.copyto(target.numpy(), arr)
     return unet
 
 
+def weights_cache_key(model_name, instrument_idx):
+    """Identify what a cached state_dict was converted from.
+
+    Covers the downloaded tarball's SHA-256 and the TF name mapping, so a cache
+    written before an offset in param_names() was corrected is not reused.
+    """
+    digest = hashlib.sha256()
+    sidecar = f"{model_name}.tar.gz.sha256"
+    if os.path.exists(sidecar):
+        with open(sidecar) as f:
+            digest.update(f.read().strip().encode())
+    digest.update(repr(sorted(param_names(instrument_idx).items())).encode())
+    return digest.hexdigest()
+
+
+def is_weights_cached(cache_path, cache_key):
+    """True if cache_path exists and was written for cache_key."""
+    from safetensors import safe_open
+
+    if not os.path.exists(cache_path):
+        return False
+    with safe_open(cache_path, framework="pt") as f:
+        return (f.metadata() or {}).get("source") == cache_key
+
+
+def load_weights(unet, instrument_idx, frozen_path, cache_path=None, cache_key=None):
+    """Fill a UNet from the frozen TF graph, or from a previous run's safetensors cache.
+
+    With cache_path set the converted state_dict is saved there, tagged with
+    cache_key, and reused on later runs with the same key without touching TF.
+    The cache is copied into the existing parameters rather than assigned,
+    since BatchNorm folding later edits them in place and must not write
+    through to the memory-mapped file.
+    """
+    from safetensors.torch import load_file, save_file
+
+    if cache_path and is_weights_cached(cache_path, cache_key):
+        print(f"  Using cached weights {cache_path}")
+        unet.load_state_dict(load_file(cache_path))
+        return unet
+
+    graph, const_ops = load_frozen_graph(frozen_path)
+    params = extract_consts(graph, const_ops, param_names(instrument_idx).values())
+    convert_weights(params, unet, instrument_idx)
+    if cache_path:
+        save_file(unet.state_dict(), cache_path, metadata={"source": cache_key})
+    return unet
+
+
+# ─── ONNX Graph Rewrites ─────────────────────────────────────────────────────
+
+def _attr(node, name, default=None):
+    for attr in node.attribute:
+        if attr.name == name:
+            return helper.get_attribute_value(attr)
+    return default
+
+
+def _set_ints(node, name, values):
+    for attr in node.attribute:
+        if attr.name == name:
+            node.attribute.remove(attr)
+            break
+    node.attribute.append(helper.make_attribute(name, [int(v) for v in values]))
+
+
+def _constant_values(graph):
+    """Map tensor name -> numpy value for initializers and Constant nodes."""
+    values = {t.name: numpy_helper.to_array(t) for t in graph.initializer}
+    for node in graph.node:
+        if node.op_type == "Constant" and _attr(node, "value") is not None:
+            values[node.output[0]] = numpy_helper.to_array(_attr(node, "value"))
+    return values
+
+
+def _consumers(graph):
+    consumers = {}
+    for node in graph.node:
+        for name in node.input:
+            consumers.setdefault(name, []).append(node)
+    return consumers
+
+
+def _prune_unused(graph):
+    """Drop nodes and initializers nothing reads any more, including dead chains."""
+    changed = True
+    while changed:
+        used = {name for node in graph.node for name in node.input}
+        used.update(out.name for out in graph.output)
+        dead = [n for n in graph.node if not any(out in used for out in n.output)]
+        for node in dead:
+            graph.node.remove(node)
+        changed = bool(dead)
+    for init in [t for t in graph.initializer if t.name not in used]:
+        graph.initializer.remove(init)
+
+
+def _evaluate_constant(onnx_model, name, consts):
+    """Evaluate a tensor whose producers depend only on constants, or return None.
+
+    The TorchScript exporter builds Pad's pads input from a ConstantOfShape ->
+    Concat -> Reshape -> Slice -> Transpose -> Reshape -> Cast chain rather
+    than a literal, so it has to be run to get the values.
+    """
+    if name in consts:
+        return consts[name]
+
+    graph = onnx_model.graph
+    producers = {out: node for node in graph.node for out in node.output}
+    chain, leaves, stack, seen = set(), set(), [name], set()
+    while stack:
+        tensor = stack.pop()
+        if not tensor or tensor in seen:
+            continue
+        seen.add(tensor)
+        if tensor in consts:
+            leaves.add(tensor)
+            continue
+        node = producers.get(tensor)
+        if node is None:
+            return None  # reaches a graph input
+        chain.add(id(node))
+        stack.extend(node.input)
+
+    from onnx.reference import ReferenceEvaluator
+
+    subgraph = helper.make_graph(
+        [node for node in graph.node if id(node) in chain],  # keeps topological order
+        "constant_eval",
+        inputs=[],
+        outputs=[onnx.ValueInfoProto(name=name)],
+        initializer=[numpy_helper.from_array(np.asarray(consts[t]), t) for t in leaves],
+    )
+    submodel = helper.make_model(subgraph, opset_imports=onnx_model.opset_import)
+    (value,) = ReferenceEvaluator(submodel).run(None, {})
+    consts[name] = value
+    return value
+
+
+def fold_pad_into_conv(onnx_model):
+    """Merge constant zero Pad nodes into the pads attribute of the Conv they feed.
+
+    The encoder's F.pad(x, (1, 2, 1, 2)) is asymmetric, which PyTorch's Conv2d
+    cannot express but ONNX's Conv pads can, so the padded copy of every
+    encoder activation disappears from the graph.
+    """
+    graph = onnx_model.graph
+    consts = _constant_values(graph)
+    consumers = _consumers(graph)
+    folded = 0
+
+    for pad in [n for n in graph.node if n.op_type == "Pad"]:
+        users = consumers.get(pad.output[0], [])
+        if len(users) != 1 or users[0].op_type != "Conv" or users[0].input[0] != pad.output[0]:
+            continue
+        conv = users[0]
+        if _attr(pad, "mode", b"constant") != b"constant" or _attr(conv, "auto_pad", b"NOTSET") != b"NOTSET":
+            continue
+        pads = _evaluate_constant(onnx_model, pad.input[1], consts) if len(pad.input) > 1 else None
+        if pads is None:
+            continue
+        if len(pad.input) > 2 and pad.input[2]:
+            value = _evaluate_constant(onnx_model, pad.input[2], consts)
+            if value is None or value.any():
+                continue
+
+        pads = pads.tolist()
+        rank = len(pads) // 2
+        begin, end = pads[:rank], pads[rank:]
+        if any(begin[:2]) or any(end[:2]) or min(pads) < 0:
+            continue
+
+        conv_pads = _attr(conv, "pads", [0] * (2 * (rank - 2)))
+        _set_ints(conv, "pads", [a + b for a, b in zip(conv_pads, begin[2:] + end[2:])])
+        conv.input[0] = pad.input[0]
+        graph.node.remove(pad)
+        folded += 1
+
+    _prune_unused(graph)
+    return folded
+
+
+def _slice_crop(node, consts, rank):
+    """Return (begin, end) spatial crops for a unit-step Slice, or None."""
+    if any(name not in consts for name in node.input[1:] if name):
+        return None
+    starts = consts[node.input[1]].tolist()
+    ends = consts[node.input[2]].tolist()
+    axes = consts[node.input[3]].tolist() if len(node.input) > 3 and node.input[3] else list(range(len(starts)))
+    steps = consts[node.input[4]].tolist() if len(node.input) > 4 and node.input[4] else [1] * len(starts)
+
+    begin, end = [0] * (rank - 2), [0] * (rank - 2)
+    for start, stop, axis, step in zip(starts, ends, axes, steps):
+        axis = axis + rank if axis < 0 else axis
+        if step != 1 or axis < 2 or start < 0:
+            return None
+        if stop < 0:
+            end[axis - 2] = -stop
+        elif stop < 2**31 - 1:
+            # A positive end needs the input shape to express as a crop
+            return None
+        begin[axis - 2] = start
+    return begin, end
+
+
+def fold_crop_into_conv_transpose(onnx_model):
+    """Express the decoder's [:, :, 1:-2, 1:-2] crops as ConvTranspose pads.
+
+    ConvTranspose pads remove rows/columns from the output, which is exactly
+    what the Slice after every decoder stage does, so no slice kernel runs.
+    """
+    graph = onnx_model.graph
+    consts = _constant_values(graph)
+    graph_outputs = {out.name for out in graph.output}
+    folded = 0
+
+    changed = True
+    while changed:
+        changed = False
+        producers = {out: node for node in graph.node for out in node.output}
+        consumers = _consumers(graph)
+        for node in [n for n in graph.node if n.op_type == "Slice"]:
+            conv = producers.get(node.input[0])
+            if conv is None or conv.op_type != "ConvTranspose":
+                continue
+            if len(consumers[conv.output[0]]) != 1 or conv.output[0] in graph_outputs:
+                continue
+            if _attr(conv, "output_shape") is not None or _attr(conv, "auto_pad", b"NOTSET") != b"NOTSET":
+                continue
+            kernel = _attr(conv, "kernel_shape") or consts[conv.input[1]].shape[2:]
+            rank = len(kernel) + 2
+            crop = _slice_crop(node, consts, rank)
+            if crop is None:
+                continue
+
+            begin, end = crop
+            conv_pads = _attr(conv, "pads", [0] * (2 * (rank - 2)))
+            _set_ints(conv, "pads", [a + b for a, b in zip(conv_pads, begin + end)])
+            conv.output[0] = node.output[0]
+            graph.node.remove(node)
+            folded += 1
+            changed = True
+            break
+
+    _prune_unused(graph)
+    return folded
+
+
 # ─── ONNX Export ─────────────────────────────────────────────────────────────
 
-def export_to_onnx(model, output_path, model_name, stem_name, num_stems):
-    """Export a PyTorch UNet to ONNX format."""
-    x = torch.rand(2, 1, 512, 1024, dtype=torch.float32)
+def export_to_onnx(model, output_path, model_name, stem_name, num_stems, fp16=False, external_data=False):
+    """Export a PyTorch UNet to ONNX format.
 
+    With fp16=True the weights and internal ops are stored as float16 while the
+    x/y inputs and outputs stay float32, so callers feed the same tensors.
+    With external_data=True the weights go to {stem}.onnx.data next to a small
+    graph-only .onnx, which ONNX Runtime can memory-map at load time.
+    """
+    x = torch.rand(1, 2, 512, 1024, dtype=torch.float32)
+
+    # NHWC conv weights make the trace and verification forward passes take
+    # PyTorch's channels-last CPU kernels. The ONNX graph itself is
+    # layout-free; ORT picks NHWC/NCHWc kernels at --ort-optimize all.
+    # The dummy input stays contiguous since onnxruntime wants C-order arrays.
+    model = model.to(memory_format=torch.channels_last)
+
+    # Export into memory and write the file once, after rewrites and metadata.
+    # dynamo=False pins the TorchScript exporter (the default since torch 2.9
+    # is dynamo): the graph rewrites below match its Pad/Slice patterns.
+    buffer = io.BytesIO()
     torch.onnx.export(
-        model, x, output_path,
+        model, x, buffer,
         input_names=["x"],
         output_names=["y"],
-        dynamic_axes={"x": {1: "num_splits"}},
-        opset_version=13,
+        dynamic_axes={"x": {0: "num_splits"}, "y": {0: "num_splits"}},
+        opset_version=17,
+        do_constant_folding=True,
+        dynamo=False,
     )
 
+    onnx_model = onnx.load_model_from_string(buffer.getvalue())
+    del buffer
+    pads_folded = fold_pad_into_conv(onnx_model)
+    crops_folded = fold_crop_into_conv_transpose(onnx_model)
+    print(f"  Folded {pads_folded} Pad nodes into Conv pads, {crops_folded} Slice crops into ConvTranspose pads")
+    if pads_folded != 6:  # one F.pad per encoder stage
+        raise RuntimeError(f"Expected to fold 6 encoder Pad nodes, folded {pads_folded}")
+
+    if fp16:
+        from onnxconverter_common import float16
+
+        onnx_model = float16.convert_float_to_float16(onnx_model, keep_io_types=True)
+
     # Add metadata
-    onnx_model = onnx.load(output_path)
     while len(onnx_model.metadata_props):
         onnx_model.metadata_props.pop()
 
@@ -304,31 +720,166 @@ def export_to_onnx(model, output_path, model_name, stem_name, num_stems):
         meta.key = key
         meta.value = value
 
-    onnx.save(onnx_model, output_path)
-    size_mb = os.path.getsize(output_path) / 1024 / 1024
+    if external_data:
+        data_name = os.path.basename(output_path) + ".data"
+        data_path = os.path.join(os.path.dirname(output_path), data_name)
+        if os.path.exists(data_path):
+            os.remove(data_path)  # onnx appends to an existing data file
+        onnx.save_model(
+            onnx_model, output_path,
+            save_as_external_data=True,
+            all_tensors_to_one_file=True,
+            location=data_name,
+            size_threshold=1024,
+        )
+        size_mb = os.path.getsize(output_path) / 1024 / 1024
+        if os.path.exists(data_path):  # not written if no initializer crossed size_threshold
+            size_mb += os.path.getsize(data_path) / 1024 / 1024
+    else:
+        onnx.save(onnx_model, output_path)
+        size_mb = os.path.getsize(output_path) / 1024 / 1024
     print(f"  Exported: {output_path} ({size_mb:.1f} MB)")
 
+    if fp16:
+        # The sigmoid masks (2/4 stems) stay in [0, 1], so a fixed atol fits them.
+        # 5stems' output_logit returns unbounded up7 * x; scale atol to its peak.
+        verify_onnx(model, output_path, x, rtol=1e-3, atol=5e-3, scale_atol=model.output_logit)
+    else:
+        verify_onnx(model, output_path, x)
 
-# ─── Main ────────────────────────────────────────────────────────────────────
 
-def main():
-    parser = argparse.ArgumentParser(description="Convert Spleeter models to ONNX")
-    parser.add_argument("--model", choices=["2stems", "4stems", "5stems"], required=True)
-    parser.add_argument("--output", default=None, help="Output directory (default: ./spleeter-onnx/{model}/)")
-    args = parser.parse_args()
+def verify_onnx(model, output_path, x, rtol=1e-3, atol=1e-4, scale_atol=False):
+    """Check an exported model against the PyTorch forward pass.
 
-    config = CONFIGS[args.model]
-    instruments = config["instruments"]
-    output_dir = args.output or f"./spleeter-onnx/{args.model}"
-    os.makedirs(output_dir, exist_ok=True)
+    With scale_atol=True, atol is relative to the largest expected magnitude.
+    """
+    import onnxruntime as ort
+
+    session = ort.InferenceSession(output_path, providers=["CPUExecutionProvider"])
+    (y,) = session.run(None, {"x": x.numpy()})
+    with torch.inference_mode():
+        expected = model(x).numpy()
+    if scale_atol:
+        atol *= float(np.abs(expected).max())
+    np.testing.assert_allclose(y, expected, rtol=rtol, atol=atol)
+
+
+ORT_OPT_LEVELS = {
+    "basic": "ORT_ENABLE_BASIC",
+    "extended": "ORT_ENABLE_EXTENDED",
+    "all": "ORT_ENABLE_ALL",
+}
+
+
+def optimize_with_ort(onnx_path, level="all", external_data=False):
+    """Run ONNX Runtime's graph optimizer once and save the result as {stem}_opt.onnx.
+
+    "basic" output is portable across providers. "extended"/"all" add fused
+    contrib ops and (for "all") CPU-specific NCHWc layouts, so those files
+    should only be served to runtimes matching the machine that produced them.
+    With external_data=True the weights go to {stem}_opt.onnx.data; otherwise
+    ORT would leave them pointing into the base model's {stem}.onnx.data.
+    """
+    import onnxruntime as ort
+
+    opt_path = onnx_path.replace(".onnx", "_opt.onnx")
+    so = ort.SessionOptions()
+    so.graph_optimization_level = getattr(ort.GraphOptimizationLevel, ORT_OPT_LEVELS[level])
+    so.optimized_model_filepath = opt_path
+    if external_data:
+        data_name = os.path.basename(opt_path) + ".data"
+        data_path = os.path.join(os.path.dirname(opt_path), data_name)
+        if os.path.exists(data_path):
+            os.remove(data_path)
+        so.add_session_config_entry("session.optimized_model_external_initializers_file_name", data_name)
+        so.add_session_config_entry("session.optimized_model_external_initializers_min_size_in_bytes", "1024")
+    ort.InferenceSession(onnx_path, so, providers=["CPUExecutionProvider"])
+
+    size_mb = os.path.getsize(opt_path) / 1024 / 1024
+    if external_data and os.path.exists(data_path):
+        size_mb += os.path.getsize(data_path) / 1024 / 1024
+    print(f"  Optimized ({level}): {opt_path} ({size_mb:.1f} MB)")
+
+
+# ─── INT8 Quantization ───────────────────────────────────────────────────────
+
+def quantize_int8(onnx_path, mode="dynamic", num_calibration=50):
+    """Write an INT8 copy of an exported model next to it as {stem}_int8.onnx.
+
+    Static mode quantizes Conv and ConvTranspose, calibrating on random
+    spectrogram-shaped inputs. Dynamic mode can only quantize Conv (ORT's
+    dynamic quantizer has no ConvTranspose), so the decoder stays float32.
+    The Sigmoid/Mul mask tail stays float in both.
+    """
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    int8_path = onnx_path.replace(".onnx", "_int8.onnx")
+    prep_path = onnx_path.replace(".onnx", "_prep.onnx")
+
+    # Symbolic shape inference + cleanup so the quantizer sees static shapes
+    quant_pre_process(onnx_path, prep_path)
+    try:
+        if mode == "static":
+            from onnxruntime.quantization import CalibrationDataReader, QuantFormat, quantize_static
+
+            class RandomSpectrograms(CalibrationDataReader):
+                def __init__(self):
+                    self.remaining = num_calibration
+
+                def get_next(self):
+                    if not self.remaining:
+                        return None
+                    self.remaining -= 1
+                    return {"x": np.random.rand(1, 2, 512, 1024).astype(np.float32)}
+
+            quantize_static(
+                prep_path, int8_path, RandomSpectrograms(),
+                quant_format=QuantFormat.QDQ,
+                op_types_to_quantize=["Conv", "ConvTranspose"],
+                per_channel=True,
+                reduce_range=False,
+                weight_type=QuantType.QInt8,
+            )
+        else:
+            print("  Dynamic INT8 leaves the ConvTranspose decoder in float32; use --int8 static to quantize it")
+            # ConvInteger only has uint8-weight kernels in older ORT releases
+            quantize_dynamic(prep_path, int8_path, weight_type=QuantType.QUInt8, op_types_to_quantize=["Conv"])
+    finally:
+        os.remove(prep_path)
+
+    size_mb = os.path.getsize(int8_path) / 1024 / 1024
+    print(f"  Quantized ({mode}): {int8_path} ({size_mb:.1f} MB)")
+
+    verify_quantized(onnx_path, int8_path)
 
-    tar_name = f"{args.model}.tar.gz"
-    extract_dir = f"./{args.model}"
+
+def verify_quantized(float_path, int8_path):
+    """Check that a quantized model loads and runs next to its float source.
+
+    Quantization error is too input-dependent for a fixed tolerance, so this
+    only asserts a finite, correctly shaped output and reports the difference.
+    """
+    import onnxruntime as ort
+
+    x = np.random.rand(1, 2, 512, 1024).astype(np.float32)
+    (expected,) = ort.InferenceSession(float_path, providers=["CPUExecutionProvider"]).run(None, {"x": x})
+    (y,) = ort.InferenceSession(int8_path, providers=["CPUExecutionProvider"]).run(None, {"x": x})
+    if y.shape != expected.shape or not np.isfinite(y).all():
+        raise RuntimeError(f"Quantized model {int8_path} produced an invalid output {y.shape}")
+    print(f"  Quantized max abs diff vs float: {np.abs(y - expected).max():.4f}")
+
+
+# ─── Main ────────────────────────────────────────────────────────────────────
+
+def prepare_frozen_graph(model_name, config, extract_dir, frozen_path):
+    """Download, extract and freeze the TF checkpoint, skipping steps already done."""
+    tar_name = f"{model_name}.tar.gz"
 
     # Step 1: Download pretrained model
-    if not os.path.exists(tar_name):
+    if not is_cached(tar_name):
         print(f"Downloading {tar_name}...")
-        urllib.request.urlretrieve(config["url"], tar_name)
+        download(config["url"], tar_name)
     else:
         print(f"Using cached {tar_name}")
 
@@ -336,43 +887,110 @@ def main():
     if not os.path.exists(extract_dir):
         print(f"Extracting {tar_name}...")
         os.makedirs(extract_dir, exist_ok=True)
-        with tarfile.open(tar_name) as tar:
-            tar.extractall(extract_dir)
+        extract_tar(tar_name, extract_dir)
 
-    # Step 3: Freeze graphs and convert each instrument
-    print(f"\nConverting {args.model} ({len(instruments)} instruments)...")
-
-    # Build output node names for freezing
-    output_nodes = ",".join(f"{inst}_spectrogram/mul" for inst in instruments)
-
-    # Freeze the full graph once (contains all instruments)
-    frozen_path = os.path.join(extract_dir, "frozen_model.pb")
+    # Step 3: Freeze the full graph once (contains all instruments)
     if not os.path.exists(frozen_path):
+        output_nodes = ",".join(f"{inst}_spectrogram/mul" for inst in config["instruments"])
         print("  Freezing TF graph...")
         freeze_graph(extract_dir, output_nodes, frozen_path)
 
-    graph = load_frozen_graph(frozen_path)
 
-    output_mode = config["output_mode"]
-    is_logit = output_mode == "softmax"
+def convert_one(idx, instrument, args, frozen_path, cache_path, output_dir, jobs):
+    """Convert and export a single instrument, inline or in a worker process."""
+    # Split the cores between workers so intra-op threads don't oversubscribe
+    torch.set_num_threads(max(1, (os.cpu_count() or 1) // jobs))
+    # Nothing here trains; this also covers weight loading and BN folding.
+    # Tracing stays outside inference_mode because the TorchScript tracer
+    # relies on version counters, which inference tensors don't have.
+    torch.set_grad_enabled(False)
 
-    for idx, instrument in enumerate(instruments):
-        print(f"\n  [{idx+1}/{len(instruments)}] Converting {instrument}...")
+    config = CONFIGS[args.model]
+    num_stems = len(config["instruments"])
+    print(f"\n  [{idx+1}/{num_stems}] Converting {instrument}...")
+
+    unet = UNet(activation=config["activation"], output_logit=config["output_mode"] == "softmax")
+    unet.eval()
+    unet = load_weights(unet, idx, frozen_path, cache_path, weights_cache_key(args.model, idx))
+    if jobs == num_stems:
+        # One instrument per worker: TF is done, release its memory before tracing.
+        # Otherwise this process converts more instruments and reuses the graph.
+        close_sessions()
+    unet.fuse_batchnorm()
+
+    output_path = os.path.join(output_dir, f"{instrument}.onnx")
+    export_to_onnx(unet, output_path, args.model, instrument, num_stems,
+                   fp16=args.fp16, external_data=args.external_data)
+    if args.ort_optimize:
+        optimize_with_ort(output_path, args.ort_optimize, external_data=args.external_data)
+    if args.int8:
+        quantize_int8(output_path, args.int8)
 
-        unet = UNet(activation=config["activation"], output_logit=is_logit)
-        unet.eval()
 
-        try:
-            unet = convert_weights(graph, unet, idx)
-        except ValueError as e:
-            print(f"  ERROR: {e}")
-            print(f"  The TF variable naming may differ for {args.model}.")
-            print(f"  You may need to inspect the frozen graph and adjust offsets.")
-            sys.exit(1)
+def main():
+    parser = argparse.ArgumentParser(description="Convert Spleeter models to ONNX")
+    parser.add_argument("--model", choices=["2stems", "4stems", "5stems"], required=True)
+    parser.add_argument("--output", default=None, help="Output directory (default: ./spleeter-onnx/{model}/)")
+    parser.add_argument("--fp16", action="store_true", help="Store weights and internal ops as float16")
+    parser.add_argument("--int8", choices=["dynamic", "static"], default=None,
+                        help="Also write an INT8-quantized {stem}_int8.onnx "
+                             "(dynamic quantizes only the encoder Convs; static also the decoder)")
+    parser.add_argument("--ort-optimize", choices=list(ORT_OPT_LEVELS), default=None,
+                        help="Also write an ONNX Runtime-optimized {stem}_opt.onnx")
+    parser.add_argument("--external-data", action="store_true",
+                        help="Store weights in {stem}.onnx.data (not loadable by stemSeparation.worker.ts as-is)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Re-convert from TF instead of reusing {model}/{stem}.safetensors")
+    parser.add_argument("--jobs", type=int, default=None,
+                        help="Instruments converted in parallel (default: all at once)")
+    args = parser.parse_args()
+    if args.jobs is not None and args.jobs < 1:
+        parser.error("--jobs must be a positive integer")
+    if args.fp16 and args.int8:
+        parser.error("--int8 quantizes the float32 export; it cannot be combined with --fp16")
+
+    config = CONFIGS[args.model]
+    instruments = config["instruments"]
+    output_dir = args.output or f"./spleeter-onnx/{args.model}"
+    os.makedirs(output_dir, exist_ok=True)
+
+    extract_dir = f"./{args.model}"
+    frozen_path = os.path.join(extract_dir, "frozen_model.pb")
+    if args.no_cache:
+        cache_paths = [None] * len(instruments)
+    else:
+        cache_paths = [os.path.join(extract_dir, f"{inst}.safetensors") for inst in instruments]
+
+    # Converted weights from a previous run make the TF checkpoint unnecessary
+    if all(path and is_weights_cached(path, weights_cache_key(args.model, idx))
+           for idx, path in enumerate(cache_paths)):
+        print(f"Using cached weights in {extract_dir}/")
+    else:
+        prepare_frozen_graph(args.model, config, extract_dir, frozen_path)
+
+    print(f"\nConverting {args.model} ({len(instruments)} instruments)...")
 
-        output_path = os.path.join(output_dir, f"{instrument}.onnx")
-        with torch.no_grad():
-            export_to_onnx(unet, output_path, args.model, instrument, len(instruments))
+    jobs = min(args.jobs or len(instruments), len(instruments))
+    tasks = [
+        (idx, instrument, args, frozen_path, cache_path, output_dir, jobs)
+        for idx, (instrument, cache_path) in enumerate(zip(instruments, cache_paths))
+    ]
+    try:
+        if jobs == 1:
+            for task in tasks:
+                convert_one(*task)
+        else:
+            # spawn: each worker gets its own TF runtime instead of a forked copy
+            ctx = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=jobs, mp_context=ctx) as pool:
+                for future in [pool.submit(convert_one, *task) for task in tasks]:
+                    future.result()
+    except WeightMappingError as e:
+        print(f"  ERROR: {e}")
+        print(f"  The TF variable naming may differ for {args.model}.")
+        print(f"  You may need to inspect the frozen graph and adjust offsets.")
+        print(f"  Caches are re-keyed when param_names() changes; --no-cache forces a fresh conversion.")
+        sys.exit(1)
 
     print(f"\nDone! ONNX models saved to {output_dir}/")
     print(f"\nTo use in Keplear, upload to HuggingFace:")
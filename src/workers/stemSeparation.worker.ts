@@ -11,6 +11,7 @@
  *     → STFT (n_fft=4096, hop=1024, Hann window, no center padding)
  *     → magnitude spectrogram (first 1024 of 2049 freq bins)
  *     → pad frames to multiple of 512, reshape to [2, chunks, 512, 1024]
+ *       (or [chunks, 2, 512, 1024] for models from scripts/convert-spleeter-onnx.py)
  *     → run each stem's ONNX model → magnitude estimates
  *     → Wiener-like soft mask normalization
  *     → apply masks to original STFT magnitude (zero-pad to 2049 bins)
@@ -167,6 +168,16 @@ async function loadOnnxModel(
   })
 }
 
+/**
+ * Models exported by scripts/convert-spleeter-onnx.py take NCHW input
+ * [num_splits, 2, 512, 1024]; the sherpa-onnx ones take [2, num_splits, 512, 1024].
+ * onnxruntime-web builds without inputMetadata get the sherpa-onnx layout.
+ */
+function isChunkMajor(session: ort.InferenceSession): boolean {
+  const input = session.inputMetadata?.[0]
+  return !!input && input.isTensor && input.shape[1] === 2
+}
+
 async function loadModels(modelName: string): Promise<void> {
   const stemNames = MODEL_STEMS[modelName]
   if (!stemNames) throw new Error(`Unknown model: ${modelName}`)
@@ -476,17 +487,27 @@ async function separateStems(
   const numChunks = Math.ceil(numFrames / CHUNK_FRAMES)
   const paddedFrames = numChunks * CHUNK_FRAMES
 
-  // Build input tensor [2, numChunks, 512, 1024]
-  // Channel layout: [left_chunks..., right_chunks...]
+  // Build input tensor, laid out the way the loaded models expect:
+  //   channel-major [2, numChunks, 512, 1024]: [left_chunks..., right_chunks...]
+  //   chunk-major   [numChunks, 2, 512, 1024]: [chunk0_left, chunk0_right, ...]
+  // Model outputs share the input layout, so frameStart() indexes both.
+  const firstSession = loadedSessions.get(stemNames[0])
+  if (!firstSession) throw new Error(`No session loaded for stem: ${stemNames[0]}`)
+  const chunkMajor = isChunkMajor(firstSession)
+  function frameStart(c: number, f: number): number {
+    if (!chunkMajor) return (c * paddedFrames + f) * MODEL_FREQ_BINS
+    const chunk = Math.floor(f / CHUNK_FRAMES)
+    return ((chunk * 2 + c) * CHUNK_FRAMES + (f % CHUNK_FRAMES)) * MODEL_FREQ_BINS
+  }
+
   const inputSize = 2 * numChunks * CHUNK_FRAMES * MODEL_FREQ_BINS
   const inputData = new Float32Array(inputSize)
 
   for (let c = 0; c < 2; c++) {
     const stft = c === 0 ? leftSTFT : rightSTFT
-    const channelOffset = c * paddedFrames * MODEL_FREQ_BINS
 
     for (let f = 0; f < numFrames; f++) {
-      const frameOffset = channelOffset + f * MODEL_FREQ_BINS
+      const frameOffset = frameStart(c, f)
       for (let k = 0; k < MODEL_FREQ_BINS; k++) {
         inputData[frameOffset + k] = stft.magnitude[f][k]
       }
@@ -497,15 +518,13 @@ async function separateStems(
   self.postMessage({ type: 'PROGRESS', progress: 20, stage: 'separating' })
 
   // Run both ONNX models
-  const inputTensor = new ort.Tensor('float32', inputData, [
-    2,
-    numChunks,
-    CHUNK_FRAMES,
-    MODEL_FREQ_BINS,
-  ])
+  const inputShape = chunkMajor
+    ? [numChunks, 2, CHUNK_FRAMES, MODEL_FREQ_BINS]
+    : [2, numChunks, CHUNK_FRAMES, MODEL_FREQ_BINS]
+  const inputTensor = new ort.Tensor('float32', inputData, inputShape)
 
   console.log(
-    `[spleeter] Running inference: input shape [2, ${numChunks}, ${CHUNK_FRAMES}, ${MODEL_FREQ_BINS}], stems=${stemNames.join(',')}`
+    `[spleeter] Running inference: input shape [${inputShape.join(', ')}], stems=${stemNames.join(',')}`
   )
 
   // Run each stem's ONNX model and collect magnitude estimates
@@ -516,6 +535,9 @@ async function separateStems(
     const stem = stemNames[s]
     const session = loadedSessions.get(stem)
     if (!session) throw new Error(`No session loaded for stem: ${stem}`)
+    if (isChunkMajor(session) !== chunkMajor) {
+      throw new Error(`Input layout of ${stem} model does not match ${stemNames[0]}`)
+    }
 
     const result = await session.run({ x: inputTensor })
     stemModelOutputs.set(stem, result.y.data as Float32Array)
@@ -618,10 +640,8 @@ async function separateStems(
   const sumPow = new Float32Array(MODEL_FREQ_BINS)
 
   for (let c = 0; c < 2; c++) {
-    const channelOffset = c * paddedFrames * MODEL_FREQ_BINS
-
     for (let f = 0; f < numFrames; f++) {
-      const frameOffset = channelOffset + f * MODEL_FREQ_BINS
+      const frameOffset = frameStart(c, f)
       const maskOffset = f * MODEL_FREQ_BINS
 
       // Sum v^6 across all stems